@@ -1,150 +1,557 @@
-import torch
-from PIL import Image
-import streamlit as st
-from typing import Optional, Dict, Any
-import time
-
-class AnalysisAgent:
-    """Agent responsible for performing image analysis using the BLIP model."""
-    
-    def __init__(self, model_management_agent):
-        self.model_agent = model_management_agent
-        self.analysis_history = []
-    
-    def analyze_image(self, image: Image.Image, prompt: str = "Describe the image", 
-                     max_tokens: int = 50) -> Dict[str, Any]:
-        
-        try:
-            # Check if model is loaded
-            if not self.model_agent.is_loaded:
-                return {
-                    'success': False,
-                    'error': 'Model not loaded. Please initialize the model first.',
-                    'caption': None,
-                    'metadata': {}
-                }
-            
-            start_time = time.time()
-            
-            # Prepare inputs for the model
-            inputs = self.model_agent.processor(
-                image, 
-                text=prompt, 
-                return_tensors="pt"
-            ).to(self.model_agent.device)
-            
-            # Generate caption
-            with st.spinner("🤖 Generating caption..."):
-                with torch.no_grad():  # Disable gradient computation for inference
-                    outputs = self.model_agent.model.generate(
-                        **inputs, 
-                        max_new_tokens=max_tokens,
-                        do_sample=True,
-                        temperature=0.7,
-                        top_p=0.9
-                    )
-            
-            # Decode the generated tokens
-            caption = self.model_agent.processor.decode(
-                outputs[0], 
-                skip_special_tokens=True
-            )
-            
-            end_time = time.time()
-            processing_time = end_time - start_time
-            
-            # Create result
-            result = {
-                'success': True,
-                'caption': caption,
-                'prompt': prompt,
-                'max_tokens': max_tokens,
-                'processing_time': processing_time,
-                'metadata': {
-                    'model_id': self.model_agent.model_id,
-                    'device': self.model_agent.device,
-                    'image_size': image.size,
-                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
-                }
-            }
-            
-            # Store in history
-            self.analysis_history.append(result)
-            
-            return result
-            
-        except Exception as e:
-            return {
-                'success': False,
-                'error': f"Analysis failed: {str(e)}",
-                'caption': None,
-                'metadata': {}
-            }
-    
-    def analyze_with_multiple_prompts(self, image: Image.Image, 
-        prompts: list, 
-        max_tokens: int = 50) -> Dict[str, Any]:
-        """
-        Analyze an image with multiple prompts and return the best result.
-        
-        Args:
-            image: PIL Image object
-            prompts: List of prompts to try
-            max_tokens: Maximum number of tokens in the generated description
-            
-        Returns:
-            Dictionary containing the best analysis result
-        """
-        results = []
-        
-        for i, prompt in enumerate(prompts):
-            st.info(f"Trying prompt {i+1}/{len(prompts)}: '{prompt}'")
-            
-            result = self.analyze_image(image, prompt, max_tokens)
-            results.append(result)
-            
-            if result['success']:
-                st.success(f"✅ Generated: {result['caption']}")
-            else:
-                st.error(f"❌ Failed: {result['error']}")
-        
-        # Return the first successful result, or the last result if all failed
-        for result in results:
-            if result['success']:
-                return result
-        
-        return results[-1] if results else {
-            'success': False,
-            'error': 'All analysis attempts failed',
-            'caption': None,
-            'metadata': {}
-        }
-    
-    def get_analysis_history(self, limit: int = 10) -> list:
-        """Get recent analysis history."""
-        return self.analysis_history[-limit:] if self.analysis_history else []
-    
-    def clear_history(self):
-        """Clear analysis history."""
-        self.analysis_history.clear()
-        st.toast("✅ Analysis history cleared!", icon="✅")
-    
-    def get_statistics(self) -> Dict[str, Any]:
-        """Get analysis statistics."""
-        if not self.analysis_history:
-            return {"message": "No analysis history available"}
-        
-        successful_analyses = [r for r in self.analysis_history if r['success']]
-        failed_analyses = [r for r in self.analysis_history if not r['success']]
-        
-        total_time = sum(r.get('processing_time', 0) for r in successful_analyses)
-        avg_time = total_time / len(successful_analyses) if successful_analyses else 0
-        
-        return {
-            'total_analyses': len(self.analysis_history),
-            'successful_analyses': len(successful_analyses),
-            'failed_analyses': len(failed_analyses),
-            'success_rate': len(successful_analyses) / len(self.analysis_history) * 100,
-            'average_processing_time': avg_time,
-            'total_processing_time': total_time
+import torch
+import numpy as np
+from PIL import Image
+import streamlit as st
+from transformers import TextIteratorStreamer
+from collections import deque
+from typing import Optional, Dict, Any
+import hashlib
+import threading
+import time
+
+class AnalysisAgent:
+    """Agent responsible for performing image analysis using the BLIP model."""
+
+    # Fixed prompt length used on compiled CUDA models so every generate
+    # call sees the same input shapes and CUDA graph replay can kick in
+    PROMPT_PAD_LENGTH = 32
+
+    def __init__(self, model_management_agent):
+        self.model_agent = model_management_agent
+        # Bounded so long-running sessions don't grow without limit
+        self.analysis_history = deque(maxlen=1000)
+        # Running counters so get_statistics never has to walk history
+        self._stats = {'total': 0, 'success': 0, 'fail': 0, 'total_time': 0.0}
+        # Last encoded image: (content key, pixel_values tensor). Keyed
+        # on a pixel digest rather than object identity because the UI
+        # cache unpickles a fresh PIL object on every rerun
+        self._pixel_cache = (None, None)
+        # Lazily built (mean, std, target_size) for the normalize fastpath
+        self._norm_constants = None
+        # Batch/benchmark callers set this to skip per-item UI writes
+        self.quiet = False
+
+    def _to_device(self, tensor: torch.Tensor, dtype=None, name=None) -> torch.Tensor:
+        """Move a CPU tensor to the model device.
+
+        On CUDA the tensor is pinned first and copied with
+        non_blocking=True so the H2D transfer overlaps with kernel launch
+        instead of serializing the request. When a buffer name is given
+        the copy lands in the model agent's pooled device buffer instead
+        of a fresh allocation.
+        """
+        device = self.model_agent.device
+        if dtype is not None:
+            tensor = tensor.to(dtype)
+        if device == "cuda":
+            if not tensor.is_pinned():
+                tensor = tensor.pin_memory()
+            if name is not None:
+                return self.model_agent.get_input_buffer(name, tensor)
+            return tensor.to(device, non_blocking=True)
+        return tensor.to(device)
+
+    def _get_norm_constants(self):
+        """Return (mean, std, target_size) for the normalize fastpath.
+
+        mean/std are scaled by 255 and kept on the model device so the
+        whole uint8-to-normalized-float transform is two vectorized ops.
+        """
+        if self._norm_constants is None:
+            image_processor = self.model_agent.processor.image_processor
+            device = self.model_agent.device
+            dtype = self.model_agent.model.dtype
+
+            size = getattr(image_processor, 'size', None)
+            if isinstance(size, dict):
+                target_size = (size.get('width', 384), size.get('height', 384))
+            else:
+                target_size = (size or 384, size or 384)
+
+            mean = torch.tensor(image_processor.image_mean,
+                                device=device, dtype=dtype).view(1, 3, 1, 1) * 255
+            std = torch.tensor(image_processor.image_std,
+                               device=device, dtype=dtype).view(1, 3, 1, 1) * 255
+            self._norm_constants = (mean, std, target_size)
+
+        return self._norm_constants
+
+    def _encode_image(self, image: Image.Image):
+        """Return pixel_values for an image, reusing the last encoding.
+
+        The BLIP image transform (resize + normalize + ToTensor) is
+        identical for every prompt, so repeat analyses of the same image
+        only pay for it once. The cache keys on a digest of the pixel
+        data (blake2b runs at multi-GB/s, negligible next to the
+        transform) because the UI's st.cache_data hands back a fresh PIL
+        object each rerun — identity would never hit across clicks.
+        Images already at the model's input size skip the processor's
+        Python-level pipeline entirely: one zero-copy NumPy view plus a
+        vectorized normalize on device.
+        """
+        cache_key = (
+            hashlib.blake2b(image.tobytes(), digest_size=16).digest(),
+            image.size, image.mode
+        )
+        cached_key, cached = self._pixel_cache
+        if cached_key == cache_key and cached is not None:
+            return cached
+
+        mean, std, target_size = self._get_norm_constants()
+
+        if image.mode == 'RGB' and image.size == target_size:
+            # Fastpath: HWC uint8 -> NCHW on device, then normalize there
+            arr = torch.from_numpy(np.asarray(image)).permute(2, 0, 1).unsqueeze(0)
+            arr = self._to_device(arr.contiguous()).to(self.model_agent.model.dtype)
+            pixel_values = (arr - mean) / std
+        else:
+            pixel_values = self._to_device(
+                self.model_agent.processor(
+                    images=image,
+                    return_tensors="pt"
+                ).pixel_values,
+                dtype=self.model_agent.model.dtype,
+                name="pixel_values"
+            )
+
+        self._pixel_cache = (cache_key, pixel_values)
+        return pixel_values
+
+    def _inference_ctx(self):
+        """Autograd-free, mixed-precision context for generate() calls.
+
+        inference_mode drops the view-tracking bookkeeping that no_grad
+        still pays per op; autocast runs CPU inference in bfloat16. On
+        CUDA the weights are already half precision, so autocast uses the
+        model's own dtype — an fp16 autocast over bf16 weights would
+        insert a cast on every matmul in the decode loop and risk
+        overflowing bf16-scale activations in fp16's narrower range.
+        """
+        device_type = "cuda" if self.model_agent.device == "cuda" else "cpu"
+        if device_type == "cuda":
+            dtype = self.model_agent.model.dtype
+        else:
+            dtype = torch.bfloat16
+        return torch.inference_mode(), torch.autocast(device_type=device_type, dtype=dtype)
+
+    def _generation_kwargs(self, max_tokens: int, do_sample: bool) -> Dict[str, Any]:
+        """Build generate() kwargs; greedy by default, sampling opt-in.
+
+        Greedy decoding skips the per-token top-p sort/filter work and is
+        reproducible, which is all captioning needs. use_cache pins the KV
+        cache on for autoregressive reuse.
+        """
+        kwargs = {
+            'max_new_tokens': max_tokens,
+            'num_beams': 1,
+            'use_cache': True,
+            'early_stopping': True,
+            'pad_token_id': self.model_agent.processor.tokenizer.pad_token_id,
+        }
+        if do_sample:
+            kwargs.update(do_sample=True, temperature=0.7, top_p=0.9)
+        return kwargs
+
+    def analyze_image(self, image: Image.Image, prompt: str = "Describe the image",
+                     max_tokens: int = 50, do_sample: bool = False) -> Dict[str, Any]:
+
+        try:
+            # Check if model is loaded
+            if not self.model_agent.is_loaded:
+                return {
+                    'success': False,
+                    'error': 'Model not loaded. Please initialize the model first.',
+                    'caption': None,
+                    'metadata': {}
+                }
+            
+            start_time = time.time()
+
+            # The pooled device buffers, pixel cache and tokenizer padding
+            # state are shared across sessions, so staging + generate runs
+            # under the model agent's inference lock
+            with self.model_agent.inference_lock:
+                # Prepare inputs: the image encoding is cached by content,
+                # only the prompt is re-tokenized
+                pixel_values = self._encode_image(image)
+
+                tokenizer = self.model_agent.processor.tokenizer
+                tokenize_kwargs = {}
+                if self.model_agent.device == "cuda" and self.model_agent.use_compile:
+                    # reduce-overhead compilation captures CUDA graphs for
+                    # static shapes; padding every prompt to one length keeps
+                    # the decode loop on the replay path
+                    tokenizer.padding_side = "left"
+                    tokenize_kwargs = {
+                        'padding': 'max_length',
+                        'max_length': self.PROMPT_PAD_LENGTH,
+                        'truncation': True,
+                    }
+
+                text_inputs = tokenizer(
+                    prompt,
+                    return_tensors="pt",
+                    **tokenize_kwargs
+                )
+                input_ids = self._to_device(text_inputs.input_ids, name="input_ids")
+                attention_mask = self._to_device(text_inputs.attention_mask, name="attention_mask")
+
+                # Generate caption
+                inference_mode, autocast = self._inference_ctx()
+                with st.spinner("🤖 Generating caption..."):
+                    with inference_mode, autocast:
+                        outputs = self.model_agent.model.generate(
+                            pixel_values=pixel_values,
+                            input_ids=input_ids,
+                            attention_mask=attention_mask,
+                            **self._generation_kwargs(max_tokens, do_sample)
+                        )
+            
+            # Decode the generated tokens
+            caption = self.model_agent.processor.decode(
+                outputs[0], 
+                skip_special_tokens=True
+            )
+            
+            end_time = time.time()
+            processing_time = end_time - start_time
+            
+            # Create result
+            result = {
+                'success': True,
+                'caption': caption,
+                'prompt': prompt,
+                'max_tokens': max_tokens,
+                'processing_time': processing_time,
+                'metadata': {
+                    'model_id': self.model_agent.model_id,
+                    'device': self.model_agent.device,
+                    'image_size': image.size,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                }
+            }
+            
+            # Store in history
+            self.analysis_history.append(result)
+            self._record_stats(True, processing_time)
+
+            return result
+
+        except Exception as e:
+            self._record_stats(False)
+            return {
+                'success': False,
+                'error': f"Analysis failed: {str(e)}",
+                'caption': None,
+                'metadata': {}
+            }
+    
+    def analyze_image_streaming(self, image: Image.Image,
+                                prompt: str = "Describe the image",
+                                max_tokens: int = 50,
+                                do_sample: bool = False) -> Dict[str, Any]:
+        """
+        Analyze an image, streaming tokens to the UI as they are generated.
+
+        Total latency matches analyze_image, but the first words appear
+        after one decode step instead of after the full generation, which
+        matters on CPU where a long caption can take seconds.
+
+        Args:
+            image: PIL Image object
+            prompt: Analysis prompt
+            max_tokens: Maximum number of tokens in the generated description
+            do_sample: Sample instead of greedy decoding
+
+        Returns:
+            Dictionary containing the analysis result (same shape as
+            analyze_image)
+        """
+        try:
+            if not self.model_agent.is_loaded:
+                return {
+                    'success': False,
+                    'error': 'Model not loaded. Please initialize the model first.',
+                    'caption': None,
+                    'metadata': {}
+                }
+
+            start_time = time.time()
+
+            # Held across the background generate thread too: released
+            # only after join, so the staged inputs stay ours
+            with self.model_agent.inference_lock:
+                pixel_values = self._encode_image(image)
+                tokenizer = self.model_agent.processor.tokenizer
+                text_inputs = tokenizer(prompt, return_tensors="pt")
+                input_ids = self._to_device(text_inputs.input_ids, name="input_ids")
+                attention_mask = self._to_device(text_inputs.attention_mask, name="attention_mask")
+
+                # The timeout bounds the iterator's queue waits so a dead
+                # generate thread cannot block the script forever
+                streamer = TextIteratorStreamer(
+                    tokenizer, skip_prompt=True, skip_special_tokens=True,
+                    timeout=120.0
+                )
+
+                inference_mode, autocast = self._inference_ctx()
+                generate_error = []
+
+                def generate():
+                    try:
+                        with inference_mode, autocast:
+                            self.model_agent.model.generate(
+                                pixel_values=pixel_values,
+                                input_ids=input_ids,
+                                attention_mask=attention_mask,
+                                streamer=streamer,
+                                **self._generation_kwargs(max_tokens, do_sample)
+                            )
+                    except Exception as e:
+                        # Unblock the consuming loop; a failed generate
+                        # never calls streamer.end() on its own
+                        generate_error.append(e)
+                        streamer.end()
+
+                thread = threading.Thread(target=generate)
+                thread.start()
+
+                # Consume tokens as they arrive, updating one placeholder
+                placeholder = st.empty()
+                caption = ""
+                try:
+                    for token in streamer:
+                        caption += token
+                        placeholder.markdown(f"**{caption}**")
+                finally:
+                    # Even if the streamer times out, generate must finish
+                    # before the inference lock is released — otherwise the
+                    # next request would copy_ over the pooled buffers it
+                    # is still reading
+                    thread.join()
+                    placeholder.empty()
+
+                if generate_error:
+                    raise generate_error[0]
+
+            processing_time = time.time() - start_time
+
+            result = {
+                'success': True,
+                'caption': caption.strip(),
+                'prompt': prompt,
+                'max_tokens': max_tokens,
+                'processing_time': processing_time,
+                'metadata': {
+                    'model_id': self.model_agent.model_id,
+                    'device': self.model_agent.device,
+                    'image_size': image.size,
+                    'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                }
+            }
+
+            self.analysis_history.append(result)
+            self._record_stats(True, processing_time)
+
+            return result
+
+        except Exception as e:
+            self._record_stats(False)
+            return {
+                'success': False,
+                'error': f"Analysis failed: {str(e)}",
+                'caption': None,
+                'metadata': {}
+            }
+
+    def analyze_images_batch(self, images: list, prompts: list,
+                             max_tokens: int = 50, do_sample: bool = False) -> list:
+        """
+        Analyze a batch of (image, prompt) pairs with a single generate call.
+
+        Batching the pairs into one padded tensor is much faster per item on
+        GPU/MPS than looping, because one large matmul amortizes kernel launch
+        overhead that a per-item loop pays repeatedly.
+
+        Args:
+            images: List of PIL Image objects (one per prompt)
+            prompts: List of prompts (same length as images)
+            max_tokens: Maximum number of tokens per generated description
+
+        Returns:
+            List of result dictionaries, one per (image, prompt) pair
+        """
+        try:
+            if not self.model_agent.is_loaded:
+                return [{
+                    'success': False,
+                    'error': 'Model not loaded. Please initialize the model first.',
+                    'caption': None,
+                    'metadata': {}
+                } for _ in prompts]
+
+            start_time = time.time()
+
+            with self.model_agent.inference_lock:
+                processor = self.model_agent.processor
+                # Left padding is required for correct batched generation
+                # with decoder-style models.
+                processor.tokenizer.padding_side = "left"
+
+                # Build one padded batch and run a single generate call.
+                # The multi-prompt flow passes the same PIL object N times;
+                # encode it once and tile the view instead of
+                # re-transforming N times.
+                model_dtype = self.model_agent.model.dtype
+                if all(image is images[0] for image in images):
+                    pixel_values = self._encode_image(images[0]).expand(
+                        len(prompts), -1, -1, -1
+                    )
+                    text_inputs = processor.tokenizer(
+                        prompts,
+                        return_tensors="pt",
+                        padding=True
+                    )
+                    inputs = {
+                        'pixel_values': pixel_values,
+                        'input_ids': self._to_device(text_inputs.input_ids,
+                                                     name="batch_input_ids"),
+                        'attention_mask': self._to_device(text_inputs.attention_mask,
+                                                          name="batch_attention_mask"),
+                    }
+                else:
+                    inputs = processor(
+                        images=images,
+                        text=prompts,
+                        return_tensors="pt",
+                        padding=True
+                    )
+                    inputs = {
+                        k: self._to_device(v, dtype=model_dtype if k == "pixel_values" else None,
+                                           name=f"batch_{k}")
+                        for k, v in inputs.items()
+                    }
+
+                inference_mode, autocast = self._inference_ctx()
+                with inference_mode, autocast:
+                    outputs = self.model_agent.model.generate(
+                        **inputs,
+                        **self._generation_kwargs(max_tokens, do_sample)
+                    )
+
+            captions = processor.batch_decode(outputs, skip_special_tokens=True)
+
+            processing_time = time.time() - start_time
+
+            results = []
+            for image, prompt, caption in zip(images, prompts, captions):
+                result = {
+                    'success': True,
+                    'caption': caption,
+                    'prompt': prompt,
+                    'max_tokens': max_tokens,
+                    'processing_time': processing_time / len(prompts),
+                    'metadata': {
+                        'model_id': self.model_agent.model_id,
+                        'device': self.model_agent.device,
+                        'image_size': image.size,
+                        'batch_size': len(prompts),
+                        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                }
+                self.analysis_history.append(result)
+                self._record_stats(True, result['processing_time'])
+                results.append(result)
+
+            return results
+
+        except Exception as e:
+            # One failure per item, mirroring the per-item successes above
+            for _ in prompts:
+                self._record_stats(False)
+            return [{
+                'success': False,
+                'error': f"Batch analysis failed: {str(e)}",
+                'caption': None,
+                'metadata': {}
+            } for _ in prompts]
+
+    def analyze_with_multiple_prompts(self, image: Image.Image,
+        prompts: list,
+        max_tokens: int = 50) -> Dict[str, Any]:
+        """
+        Analyze an image with multiple prompts and return the best result.
+
+        All prompts are batched into a single generate call instead of one
+        model call per prompt.
+
+        Args:
+            image: PIL Image object
+            prompts: List of prompts to try
+            max_tokens: Maximum number of tokens in the generated description
+
+        Returns:
+            Dictionary containing the best analysis result
+        """
+        if not self.quiet:
+            st.info(f"Running {len(prompts)} prompts in a single batch...")
+
+        results = self.analyze_images_batch([image] * len(prompts), prompts, max_tokens)
+
+        if not self.quiet:
+            for result in results:
+                if result['success']:
+                    st.success(f"✅ Generated: {result['caption']}")
+                else:
+                    st.error(f"❌ Failed: {result['error']}")
+
+        # Return the first successful result, or the last result if all failed
+        for result in results:
+            if result['success']:
+                return result
+
+        return results[-1] if results else {
+            'success': False,
+            'error': 'All analysis attempts failed',
+            'caption': None,
+            'metadata': {}
+        }
+    
+    def _record_stats(self, success: bool, processing_time: float = 0.0):
+        """Update the running counters behind get_statistics."""
+        self._stats['total'] += 1
+        if success:
+            self._stats['success'] += 1
+            self._stats['total_time'] += processing_time
+        else:
+            self._stats['fail'] += 1
+
+    def get_analysis_history(self, limit: int = 10) -> list:
+        """Get recent analysis history."""
+        if not self.analysis_history:
+            return []
+        return list(self.analysis_history)[-limit:]
+
+    def clear_history(self):
+        """Clear analysis history."""
+        self.analysis_history.clear()
+        self._stats = {'total': 0, 'success': 0, 'fail': 0, 'total_time': 0.0}
+        st.toast("✅ Analysis history cleared!", icon="✅")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get analysis statistics from the O(1) running counters."""
+        if not self._stats['total']:
+            return {"message": "No analysis history available"}
+
+        successes = self._stats['success']
+        total_time = self._stats['total_time']
+        avg_time = total_time / successes if successes else 0
+
+        return {
+            'total_analyses': self._stats['total'],
+            'successful_analyses': successes,
+            'failed_analyses': self._stats['fail'],
+            'success_rate': successes / self._stats['total'] * 100,
+            'average_processing_time': avg_time,
+            'total_processing_time': total_time
         } 
\ No newline at end of file
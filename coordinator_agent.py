@@ -1,10 +1,18 @@
 import streamlit as st
 from typing import Optional, Dict, Any
+import asyncio
+import concurrent.futures
+import threading
 import time
 
 class CoordinatorAgent:
     """Agent responsible for orchestrating communication between all other agents."""
-    
+
+    # Dynamic batching: wait up to this long for more requests to arrive
+    # before running a batch, capped at this many items
+    BATCH_TIMEOUT_S = 0.05
+    MAX_BATCH_SIZE = 8
+
     def __init__(self):
         self.agents = {}
         self.system_status = {
@@ -12,6 +20,11 @@ class CoordinatorAgent:
             'last_activity': None,
             'total_operations': 0
         }
+        # Lazily started background loop that coalesces concurrent
+        # analysis requests into batched generate calls
+        self._batch_loop = None
+        self._infer_queue = None
+        self._batch_worker_lock = threading.Lock()
     
     def register_agent(self, agent_name: str, agent_instance):
         """Register an agent with the coordinator."""
@@ -35,10 +48,12 @@ class CoordinatorAgent:
                 st.error(f"❌ Missing agents: {', '.join(missing_agents)}")
                 return False
             
-            # Initialize model management agent
+            # Initialize model management agent; initialize_model also
+            # runs a dummy generate so the caching allocator's working
+            # set is resident before the first user analysis
             model_agent = self.agents['model_management']
             success, error = model_agent.initialize_model()
-            
+
             if not success:
                 st.error(f"❌ Model initialization failed: {error}")
                 return False
@@ -53,8 +68,8 @@ class CoordinatorAgent:
             st.error(f"❌ System initialization failed: {str(e)}")
             return False
     
-    def process_image_analysis(self, image, prompt: str = "a photography of", 
-                             max_tokens: int = 50) -> Dict[str, Any]:
+    def process_image_analysis(self, image, prompt: str = "a photography of",
+                             max_tokens: int = 50, quiet: bool = False) -> Dict[str, Any]:
         """
         Coordinate the complete image analysis workflow.
         
@@ -62,14 +77,15 @@ class CoordinatorAgent:
             image: PIL Image object
             prompt: Analysis prompt
             max_tokens: Maximum tokens for generation
-            
+            quiet: Suppress per-item UI status writes (used in batch loops)
+
         Returns:
             Dictionary containing analysis results and workflow metadata
         """
         try:
             self.system_status['total_operations'] += 1
             start_time = time.time()
-            
+
             # Step 1: Validate system status
             if not self.system_status['initialized']:
                 return {
@@ -77,18 +93,25 @@ class CoordinatorAgent:
                     'error': 'System not initialized',
                     'workflow_metadata': {}
                 }
-            
+
             # Step 2: Preprocess image using image processing agent
             image_agent = self.agents['image_processing']
-            processed_image = image_agent.preprocess_image(image)
-            
-            # Step 3: Perform analysis using analysis agent
             analysis_agent = self.agents['analysis']
-            analysis_result = analysis_agent.analyze_image(
-                processed_image, 
-                prompt, 
-                max_tokens
-            )
+
+            image_agent.quiet = quiet
+            analysis_agent.quiet = quiet
+            try:
+                processed_image = image_agent.preprocess_image(image)
+
+                # Step 3: Perform analysis using analysis agent
+                analysis_result = analysis_agent.analyze_image(
+                    processed_image,
+                    prompt,
+                    max_tokens
+                )
+            finally:
+                image_agent.quiet = False
+                analysis_agent.quiet = False
             
             # Step 4: Update system status
             self.system_status['last_activity'] = time.strftime('%Y-%m-%d %H:%M:%S')
@@ -112,7 +135,123 @@ class CoordinatorAgent:
                 'error': f'Workflow coordination failed: {str(e)}',
                 'workflow_metadata': {}
             }
-    
+
+    def _ensure_batch_worker(self):
+        """Start the background batching loop on first use."""
+        with self._batch_worker_lock:
+            if self._batch_loop is not None:
+                return
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._infer_queue = asyncio.Queue()
+                loop.create_task(self._batch_worker())
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, daemon=True, name="batch-worker").start()
+            ready.wait()
+            self._batch_loop = loop
+
+    async def _batch_worker(self):
+        """Drain the inference queue into batched generate calls.
+
+        Accumulates requests for up to BATCH_TIMEOUT_S (or MAX_BATCH_SIZE
+        items) so concurrent sessions share one forward pass instead of
+        serializing single-image generates on the GPU.
+        """
+        while True:
+            batch = [await self._infer_queue.get()]
+
+            while len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(await asyncio.wait_for(
+                        self._infer_queue.get(), self.BATCH_TIMEOUT_S
+                    ))
+                except asyncio.TimeoutError:
+                    break
+
+            images = [item['image'] for item in batch]
+            prompts = [item['prompt'] for item in batch]
+            max_tokens = max(item['max_tokens'] for item in batch)
+
+            try:
+                results = self.agents['analysis'].analyze_images_batch(
+                    images, prompts, max_tokens
+                )
+            except Exception as e:
+                results = [{
+                    'success': False,
+                    'error': f'Batched analysis failed: {str(e)}',
+                    'caption': None,
+                    'metadata': {}
+                } for _ in batch]
+
+            for item, result in zip(batch, results):
+                item['future'].set_result(result)
+
+    def process_image_analysis_batched(self, image, prompt: str = "a photography of",
+                                       max_tokens: int = 50,
+                                       timeout: float = 120.0) -> Dict[str, Any]:
+        """Like process_image_analysis, but coalesced with concurrent requests.
+
+        The request is queued to the background batch worker and blocks on
+        its future; requests arriving within the batching window run in a
+        single batched generate call.
+        """
+        if not self.system_status['initialized']:
+            return {
+                'success': False,
+                'error': 'System not initialized',
+                'workflow_metadata': {}
+            }
+
+        self._ensure_batch_worker()
+        self.system_status['total_operations'] += 1
+
+        image_agent = self.agents['image_processing']
+        image_agent.quiet = True
+        try:
+            processed_image = image_agent.preprocess_image(image)
+        finally:
+            image_agent.quiet = False
+
+        future = concurrent.futures.Future()
+        self._batch_loop.call_soon_threadsafe(
+            self._infer_queue.put_nowait,
+            {'image': processed_image, 'prompt': prompt,
+             'max_tokens': max_tokens, 'future': future}
+        )
+
+        result = future.result(timeout=timeout)
+        self.system_status['last_activity'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        return result
+
+    def process_images_batch(self, images, prompt: str = "a photography of",
+                             max_tokens: int = 50) -> list:
+        """Run the analysis workflow over many images with quiet agents.
+
+        Per-item st.success/st.info writes would serialize the loop on
+        Streamlit IPC, so the agents run quiet and progress is reported
+        through a single progress bar plus one aggregate status line.
+        """
+        results = []
+        progress = st.progress(0.0)
+
+        for i, image in enumerate(images):
+            results.append(
+                self.process_image_analysis(image, prompt, max_tokens, quiet=True)
+            )
+            progress.progress((i + 1) / len(images))
+
+        succeeded = sum(1 for r in results if r['success'])
+        st.success(f"✅ Batch complete: {succeeded}/{len(images)} images analyzed")
+
+        return results
+
     def get_system_status(self) -> Dict[str, Any]:
         """Get comprehensive system status."""
         status = {
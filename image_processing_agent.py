@@ -1,114 +1,247 @@
-import torch
-from PIL import Image
-import io
-import requests
-import streamlit as st
-from typing import Union, Optional, Tuple
-
-class ImageProcessingAgent:
-    #Agent responsible for image processing, loading, and validation.
-    
-    def __init__(self):
-        self.supported_formats = ['png', 'jpg', 'jpeg', 'gif', 'bmp']
-        self.max_image_size = 10 * 1024 * 1024  # 10MB limit
-    
-    def validate_image_format(self, filename: str) -> bool:
-        """Validate if the image format is supported."""
-        if not filename:
-            return False
-        
-        file_extension = filename.lower().split('.')[-1]
-        return file_extension in self.supported_formats
-    
-    def validate_image_size(self, file_size: int) -> bool:
-        """Validate if the image size is within acceptable limits."""
-        return file_size <= self.max_image_size
-    
-    def load_image_from_file(self, uploaded_file) -> Tuple[Optional[Image.Image], Optional[str]]:
-        """Load image from uploaded file."""
-        try:
-            if uploaded_file is None:
-                return None, "No file uploaded"
-            
-            # Validate file format
-            if not self.validate_image_format(uploaded_file.name):
-                return None, f"Unsupported file format. Supported formats: {', '.join(self.supported_formats)}"
-            
-            # Validate file size
-            uploaded_file.seek(0, 2)  # Seek to end
-            file_size = uploaded_file.tell()
-            uploaded_file.seek(0)  # Reset to beginning
-            
-            if not self.validate_image_size(file_size):
-                return None, f"File too large. Maximum size: {self.max_image_size // (1024*1024)}MB"
-            
-            # Load image
-            image_data = uploaded_file.read()
-            image = Image.open(io.BytesIO(image_data)).convert("RGB")
-            
-            st.success("✅ Image loaded successfully!")
-            return image, None
-            
-        except Exception as e:
-            return None, f"Error loading image: {str(e)}"
-    
-    def load_image_from_url(self, url: str) -> Tuple[Optional[Image.Image], Optional[str]]:
-        """Load image from URL."""
-        try:
-            if not url or not url.strip():
-                return None, "No URL provided"
-            
-            # Validate URL format
-            if not url.startswith(('http://', 'https://')):
-                return None, "Invalid URL format. Must start with http:// or https://"
-            
-            # Download image
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # Validate content type
-            content_type = response.headers.get('content-type', '').lower()
-            if not any(format_type in content_type for format_type in ['image/', 'jpeg', 'png', 'gif', 'bmp']):
-                return None, "URL does not point to a valid image file"
-            
-            # Load image
-            image = Image.open(io.BytesIO(response.content)).convert("RGB")
-            
-            st.success("✅ Image loaded from URL successfully!")
-            return image, None
-            
-        except requests.exceptions.RequestException as e:
-            return None, f"Error downloading image: {str(e)}"
-        except Exception as e:
-            return None, f"Error processing image from URL: {str(e)}"
-    
-    def preprocess_image(self, image: Image.Image) -> Image.Image:
-        """Preprocess image for analysis."""
-        try:
-            # Convert to RGB if not already
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # Resize if too large (optional optimization)
-            max_dimension = 1024
-            if max(image.size) > max_dimension:
-                ratio = max_dimension / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
-                st.info(f"Image resized to {new_size} for optimal processing")
-            
-            return image
-            
-        except Exception as e:
-            st.error(f"Error preprocessing image: {str(e)}")
-            return image
-    
-    def get_image_info(self, image: Image.Image) -> dict:
-        """Get basic information about the image."""
-        return {
-            'size': image.size,
-            'mode': image.mode,
-            'format': getattr(image, 'format', 'Unknown'),
-            'width': image.width,
-            'height': image.height
-        } 
\ No newline at end of file
+import torch
+from PIL import Image
+import asyncio
+import functools
+import hashlib
+import io
+import os
+import requests
+import streamlit as st
+from typing import Union, Optional, Tuple, List
+
+# Substrings accepted in an image response's Content-Type header
+_IMG_CONTENT = ('image/', 'jpeg', 'png', 'gif', 'bmp')
+
+
+@functools.lru_cache(maxsize=32)
+def _decode_cached(digest: bytes, image_bytes: bytes) -> Image.Image:
+    """Decode image bytes, memoized by content digest.
+
+    Streamlit reruns resubmit the same upload repeatedly; hashing the raw
+    bytes (blake2b runs at multi-GB/s, negligible next to a decode) lets
+    repeat submissions skip the full libjpeg/libpng decode. Callers must
+    .copy() the result before mutating it.
+
+    BLIP consumes 384x384 tensors, so a 512x512 draft target gives
+    libjpeg room to decode large JPEGs at 1/2, 1/4 or 1/8 DCT scale
+    while leaving margin for a clean final resize.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.draft('RGB', (512, 512))
+    image.load()
+    return image.convert("RGB")
+
+
+@st.cache_data(hash_funcs={Image.Image: lambda im: (im.size, im.mode,
+                                                    getattr(im, 'format', None))},
+               max_entries=16)
+def _image_info_cached(image: Image.Image) -> dict:
+    """Image metadata dict, memoized per rerun.
+
+    Hashing a PIL image by pixel content would defeat the point, so the
+    cache keys on (size, mode, format) — every field the dict derives
+    from the image.
+    """
+    return {
+        'size': image.size,
+        'mode': image.mode,
+        'format': getattr(image, 'format', 'Unknown'),
+        'width': image.width,
+        'height': image.height
+    }
+
+class ImageProcessingAgent:
+    #Agent responsible for image processing, loading, and validation.
+    
+    def __init__(self):
+        self.supported_formats = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp'})
+        self.max_image_size = 10 * 1024 * 1024  # 10MB limit
+        # Reused across URL fetches so repeated calls to the same host
+        # amortize the TCP/TLS handshake; the adapter keeps a pool of
+        # connections and retries transient failures
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=32, pool_maxsize=64, max_retries=3
+        )
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        # Batch/benchmark callers set this to skip per-item UI writes
+        self.quiet = False
+    
+    def validate_image_format(self, filename: str) -> bool:
+        """Validate if the image format is supported."""
+        if not filename:
+            return False
+
+        file_extension = os.path.splitext(filename)[1][1:].lower()
+        return file_extension in self.supported_formats
+    
+    def validate_image_size(self, file_size: int) -> bool:
+        """Validate if the image size is within acceptable limits."""
+        return file_size <= self.max_image_size
+    
+    def load_image_from_file(self, uploaded_file) -> Tuple[Optional[Image.Image], Optional[str]]:
+        """Load image from uploaded file."""
+        try:
+            if uploaded_file is None:
+                return None, "No file uploaded"
+            
+            # Validate file format
+            if not self.validate_image_format(uploaded_file.name):
+                return None, f"Unsupported file format. Supported formats: {', '.join(sorted(self.supported_formats))}"
+            
+            # Validate file size
+            uploaded_file.seek(0, 2)  # Seek to end
+            file_size = uploaded_file.tell()
+            uploaded_file.seek(0)  # Reset to beginning
+            
+            if not self.validate_image_size(file_size):
+                return None, f"File too large. Maximum size: {self.max_image_size // (1024*1024)}MB"
+            
+            # Load image, deduplicated by content hash so re-submitting
+            # the same file on a rerun skips the decode entirely
+            image_data = uploaded_file.read()
+            digest = hashlib.blake2b(image_data, digest_size=16).digest()
+            image = _decode_cached(digest, image_data).copy()
+            
+            if not self.quiet:
+                st.success("✅ Image loaded successfully!")
+            return image, None
+            
+        except Exception as e:
+            return None, f"Error loading image: {str(e)}"
+    
+    def load_image_from_bytes(self, image_data: bytes,
+                              filename: str = "") -> Tuple[Optional[Image.Image], Optional[str]]:
+        """Load an image from raw bytes (UI caching entry point)."""
+        try:
+            if not image_data:
+                return None, "No image data provided"
+
+            if filename and not self.validate_image_format(filename):
+                return None, f"Unsupported file format. Supported formats: {', '.join(sorted(self.supported_formats))}"
+
+            if not self.validate_image_size(len(image_data)):
+                return None, f"File too large. Maximum size: {self.max_image_size // (1024*1024)}MB"
+
+            digest = hashlib.blake2b(image_data, digest_size=16).digest()
+            return _decode_cached(digest, image_data).copy(), None
+
+        except Exception as e:
+            return None, f"Error loading image: {str(e)}"
+
+    def load_image_from_url(self, url: str) -> Tuple[Optional[Image.Image], Optional[str]]:
+        """Load image from URL."""
+        try:
+            if not url or not url.strip():
+                return None, "No URL provided"
+            
+            # Validate URL format
+            if not url.startswith(('http://', 'https://')):
+                return None, "Invalid URL format. Must start with http:// or https://"
+            
+            # Download image over the pooled session, streaming the body
+            response = self._session.get(url, timeout=30, stream=True)
+            response.raise_for_status()
+            
+            # Validate content type
+            content_type = response.headers.get('content-type', '').lower()
+            if not any(format_type in content_type for format_type in _IMG_CONTENT):
+                return None, "URL does not point to a valid image file"
+            
+            # Load image straight from the streamed body
+            # (draft() is a no-op for non-JPEG formats)
+            image = Image.open(io.BytesIO(response.raw.read(decode_content=True)))
+            image.draft('RGB', (512, 512))
+            image = image.convert("RGB")
+            
+            if not self.quiet:
+                st.success("✅ Image loaded from URL successfully!")
+            return image, None
+            
+        except requests.exceptions.RequestException as e:
+            return None, f"Error downloading image: {str(e)}"
+        except Exception as e:
+            return None, f"Error processing image from URL: {str(e)}"
+
+    def load_images_from_urls(self, urls: List[str],
+                              max_concurrency: int = 32) -> List[Tuple[Optional[Image.Image], Optional[str]]]:
+        """Load multiple images from URLs concurrently.
+
+        Bulk URL ingestion is I/O-bound, so overlapping the downloads with
+        asyncio + aiohttp is roughly max_concurrency times faster than
+        fetching them one at a time.
+
+        Args:
+            urls: List of image URLs
+            max_concurrency: Maximum number of downloads in flight
+
+        Returns:
+            List of (image, error) tuples in the same order as urls
+        """
+        import aiohttp
+
+        async def fetch_one(session, semaphore, url):
+            try:
+                if not url.startswith(('http://', 'https://')):
+                    return None, "Invalid URL format. Must start with http:// or https://"
+
+                async with semaphore:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                        response.raise_for_status()
+                        buffer = io.BytesIO()
+                        async for chunk in response.content.iter_chunked(65536):
+                            buffer.write(chunk)
+
+                image = Image.open(buffer)
+                image.draft('RGB', (512, 512))
+                return image.convert("RGB"), None
+
+            except Exception as e:
+                return None, f"Error downloading image: {str(e)}"
+
+        async def fetch_all():
+            semaphore = asyncio.Semaphore(max_concurrency)
+            async with aiohttp.ClientSession() as session:
+                return await asyncio.gather(
+                    *(fetch_one(session, semaphore, url) for url in urls)
+                )
+
+        return asyncio.run(fetch_all())
+
+    @staticmethod
+    def _ensure_rgb(image: Image.Image) -> Image.Image:
+        """Return the image in RGB mode, without copying if already RGB.
+
+        The load_image_from_* paths already convert to RGB, so converting
+        again would just allocate another full-resolution buffer.
+        """
+        if image.mode == 'RGB':
+            return image
+        return image.convert('RGB')
+
+    def preprocess_image(self, image: Image.Image) -> Image.Image:
+        """Preprocess image for analysis."""
+        try:
+            image = self._ensure_rgb(image)
+
+            # Downscale in place if too large; thumbnail avoids the
+            # allocate-new/free-old pair that resize() would do.
+            # BILINEAR is several times cheaper than LANCZOS and the
+            # model's processor resizes to 384x384 afterwards anyway,
+            # so the extra filter quality never reaches the tensor.
+            max_dimension = 1024
+            if max(image.size) > max_dimension:
+                image.thumbnail((max_dimension, max_dimension), Image.Resampling.BILINEAR)
+                if not self.quiet:
+                    st.info(f"Image resized to {image.size} for optimal processing")
+            
+            return image
+            
+        except Exception as e:
+            st.error(f"Error preprocessing image: {str(e)}")
+            return image
+    
+    def get_image_info(self, image: Image.Image) -> dict:
+        """Get basic information about the image."""
+        return _image_info_cached(image) 
\ No newline at end of file
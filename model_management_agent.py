@@ -1,152 +1,331 @@
-import torch
-import streamlit as st
-from transformers import BlipProcessor, BlipForConditionalGeneration
-from typing import Tuple, Optional
-import gc
-
-class ModelManagementAgent:
-    """Agent responsible for model loading, caching, and device management."""
-    
-    def __init__(self):
-        self.model_id = "Salesforce/blip-image-captioning-large"
-        self.model = None
-        self.processor = None
-        self.device = None
-        self.is_loaded = False
-    
-    def get_device_info(self) -> str:
-        """Determine the best available device for model execution."""
-        if torch.cuda.is_available():
-            device = "cuda"
-            # Get GPU info
-            gpu_name = torch.cuda.get_device_name(0)
-            gpu_memory = torch.cuda.get_device_properties(0).total_memory / (1024**3)
-            st.info(f"🚀 Using GPU: {gpu_name} ({gpu_memory:.1f}GB)")
-        else:
-            device = "cpu"
-            st.info("💻 Using CPU for inference")
-        
-        return device
-    
-    @staticmethod
-    @st.cache_resource
-    def _load_processor_cached(model_id: str):
-        """Load the BLIP processor with caching (no UI elements)."""
-        try:
-            processor = BlipProcessor.from_pretrained(model_id)
-            return processor, None
-        except Exception as e:
-            return None, str(e)
-    
-    @staticmethod
-    @st.cache_resource
-    def _load_model_cached(model_id: str, device: str):
-        """Load the BLIP model with caching (no UI elements)."""
-        try:
-            model = BlipForConditionalGeneration.from_pretrained(model_id).to(device)
-            return model, None
-        except Exception as e:
-            return None, str(e)
-    
-    def load_processor(self):
-        """Load the BLIP processor with UI feedback."""
-        with st.spinner("Loading model processor..."):
-            processor, error = self._load_processor_cached(self.model_id)
-        
-        if processor is not None:
-            st.success("✅ Processor loaded successfully!")
-        else:
-            st.error(f"❌ Error loading processor: {error}")
-        
-        return processor
-    
-    def load_model(self, device: str):
-        """Load the BLIP model with UI feedback."""
-        with st.spinner("Loading model... (This may take a while on first run)"):
-            model, error = self._load_model_cached(self.model_id, device)
-        
-        if model is not None:
-            st.success("✅ Model loaded successfully!")
-        else:
-            st.error(f"❌ Error loading model: {error}")
-        
-        return model
-    
-    def initialize_model(self) -> Tuple[bool, Optional[str]]:
-        """Initialize the model and processor."""
-        try:
-            # Get device
-            self.device = self.get_device_info()
-            
-            # Load processor
-            self.processor = self.load_processor()
-            if self.processor is None:
-                return False, "Failed to load processor"
-            
-            # Load model
-            self.model = self.load_model(self.device)
-            if self.model is None:
-                return False, "Failed to load model"
-            
-            self.is_loaded = True
-            return True, None
-            
-        except Exception as e:
-            return False, f"Error initializing model: {str(e)}"
-    
-    def get_model_status(self) -> dict:
-        """Get current model status."""
-        return {
-            'is_loaded': self.is_loaded,
-            'device': self.device,
-            'model_id': self.model_id,
-            'has_model': self.model is not None,
-            'has_processor': self.processor is not None
-        }
-    
-    def cleanup_resources(self):
-        """Clean up model resources to free memory."""
-        try:
-            if self.model is not None:
-                del self.model
-                self.model = None
-            
-            if self.processor is not None:
-                del self.processor
-                self.processor = None
-            
-            # Clear cache
-            st.cache_resource.clear()
-            
-            # Force garbage collection
-            gc.collect()
-            
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-            
-            self.is_loaded = False
-            st.success("✅ Resources cleaned up successfully!")
-            
-        except Exception as e:
-            st.error(f"❌ Error cleaning up resources: {str(e)}")
-    
-    def get_model_info(self) -> dict:
-        """Get detailed information about the loaded model."""
-        if not self.is_loaded:
-            return {"error": "Model not loaded"}
-        
-        info = {
-            'model_id': self.model_id,
-            'device': self.device,
-            'model_type': type(self.model).__name__,
-            'processor_type': type(self.processor).__name__,
-        }
-        
-        if torch.cuda.is_available():
-            info.update({
-                'gpu_name': torch.cuda.get_device_name(0),
-                'gpu_memory_allocated': f"{torch.cuda.memory_allocated(0) / (1024**3):.2f}GB",
-                'gpu_memory_cached': f"{torch.cuda.memory_reserved(0) / (1024**3):.2f}GB"
-            })
-        
-        return info 
\ No newline at end of file
+import os
+
+# Must be set before the first CUDA allocation: expandable segments let the
+# caching allocator reuse blocks across generate calls of varying sequence
+# length instead of fragmenting HBM
+os.environ.setdefault(
+    "PYTORCH_CUDA_ALLOC_CONF",
+    "expandable_segments:True,max_split_size_mb:128"
+)
+
+import torch
+import streamlit as st
+from transformers import BlipProcessor, BlipForConditionalGeneration
+from typing import Tuple, Optional
+import copy
+import gc
+import threading
+
+class ModelManagementAgent:
+    """Agent responsible for model loading, caching, and device management."""
+    
+    def __init__(self, use_compile: bool = True, use_int8: bool = False):
+        self.model_id = "Salesforce/blip-image-captioning-large"
+        self.model = None
+        self.processor = None
+        self.device = None
+        self.is_loaded = False
+        # torch.compile pays off on GPU; CPU-only deployments can disable it
+        self.use_compile = use_compile
+        # int8 weights via bitsandbytes; halves memory again vs FP16 on
+        # GPUs where the optional dependency is installed
+        self.use_int8 = use_int8
+        # Batch/benchmark callers set this to skip per-item UI writes
+        self.quiet = False
+        # Persistent device buffers keyed by (name, shape, dtype) so
+        # fixed-size inputs like pixel_values reuse one allocation
+        self._buffer_pool = {}
+        # The agents are shared across sessions (st.cache_resource) and
+        # with the coordinator's batch worker thread, and the pooled
+        # buffers, tokenizer padding state and pixel cache are all
+        # per-request mutable. Holding this for the whole input-staging +
+        # generate span keeps one request from overwriting another's
+        # inputs mid-flight.
+        self.inference_lock = threading.Lock()
+        # Memoized get_model_info dict; rebuilt after (re)load/cleanup
+        self._cached_info = None
+
+        if torch.cuda.is_available():
+            # Leave headroom for Streamlit and other processes on the GPU
+            torch.cuda.memory.set_per_process_memory_fraction(0.8)
+    
+    def get_device_info(self) -> str:
+        """Determine the best available device for model execution."""
+        if torch.cuda.is_available():
+            device = "cuda"
+            # Get GPU info
+            gpu_name = torch.cuda.get_device_name(0)
+            gpu_memory = torch.cuda.get_device_properties(0).total_memory / (1024**3)
+            st.info(f"🚀 Using GPU: {gpu_name} ({gpu_memory:.1f}GB)")
+        else:
+            device = "cpu"
+            st.info("💻 Using CPU for inference")
+        
+        return device
+    
+    @staticmethod
+    @st.cache_resource
+    def _load_processor_cached(model_id: str):
+        """Load the BLIP processor with caching (no UI elements)."""
+        try:
+            processor = BlipProcessor.from_pretrained(model_id)
+            return processor, None
+        except Exception as e:
+            return None, str(e)
+    
+    @staticmethod
+    @st.cache_resource
+    def _load_model_cached(model_id: str):
+        """Load the BLIP model once, CPU-resident (no UI elements).
+
+        Keyed on model_id only: toggling device mid-session must not
+        reload ~2 GB of weights from disk — moving them is cheap,
+        loading them is not. low_cpu_mem_usage halves peak RAM during
+        the load itself.
+        """
+        try:
+            try:
+                # SDPA dispatches to flash kernels on Ampere+ GPUs and
+                # avoids materializing the O(N^2) attention matrix
+                model = BlipForConditionalGeneration.from_pretrained(
+                    model_id, low_cpu_mem_usage=True,
+                    attn_implementation="sdpa"
+                )
+            except (TypeError, ValueError):
+                # Older transformers without the attn_implementation kwarg
+                model = BlipForConditionalGeneration.from_pretrained(
+                    model_id, low_cpu_mem_usage=True
+                )
+            model.eval()
+            return model, None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    @st.cache_resource
+    def _quantize_model_cached(model_id: str):
+        """Load the model with int8 weights (requires bitsandbytes)."""
+        try:
+            model = BlipForConditionalGeneration.from_pretrained(
+                model_id, low_cpu_mem_usage=True, load_in_8bit=True
+            )
+            model.eval()
+            return model, None
+        except Exception as e:
+            return None, str(e)
+
+    @staticmethod
+    @st.cache_resource
+    def _prepare_model_cached(model_id: str, device: str,
+                              use_compile: bool = False, use_int8: bool = False):
+        """Move the cached weights to the target device and optionally compile."""
+        if use_int8 and device == "cuda":
+            # bitsandbytes places the quantized weights on GPU itself;
+            # no dtype move applies afterwards
+            model, error = ModelManagementAgent._quantize_model_cached(model_id)
+            if model is not None:
+                return model, None
+            # Fall back to the half-precision path if int8 loading failed
+
+        model, error = ModelManagementAgent._load_model_cached(model_id)
+        if model is None:
+            return None, error
+
+        try:
+            if device == "cuda":
+                # Half precision on GPU halves HBM traffic for the
+                # bandwidth-bound generation loop; bf16 where the hardware
+                # supports it natively, fp16 otherwise
+                if torch.cuda.is_bf16_supported():
+                    dtype = torch.bfloat16
+                else:
+                    dtype = torch.float16
+                # .to() moves the module in place, which would turn the
+                # shared CPU cache entry into a CUDA model and break a
+                # later CPU prepare; copy first so the cached weights
+                # really stay CPU-resident
+                model = copy.deepcopy(model).to(device, dtype=dtype)
+
+            if use_compile:
+                # Fuse attention/LN/GELU kernels and skip Python per-op
+                # dispatch in the decoder loop
+                model = torch.compile(model, mode="reduce-overhead",
+                                      fullgraph=False, dynamic=True)
+
+            return model, None
+        except Exception as e:
+            return None, str(e)
+    
+    def load_processor(self):
+        """Load the BLIP processor with UI feedback."""
+        with st.spinner("Loading model processor..."):
+            processor, error = self._load_processor_cached(self.model_id)
+        
+        if processor is not None:
+            if not self.quiet:
+                st.success("✅ Processor loaded successfully!")
+        else:
+            st.error(f"❌ Error loading processor: {error}")
+        
+        return processor
+    
+    def load_model(self, device: str):
+        """Load the BLIP model with UI feedback."""
+        # Compiling only helps meaningfully on GPU
+        use_compile = self.use_compile and device == "cuda"
+
+        with st.spinner("Loading model... (This may take a while on first run)"):
+            model, error = self._prepare_model_cached(
+                self.model_id, device, use_compile, self.use_int8
+            )
+        
+        if model is not None:
+            if not self.quiet:
+                st.success("✅ Model loaded successfully!")
+        else:
+            st.error(f"❌ Error loading model: {error}")
+        
+        return model
+    
+    def initialize_model(self) -> Tuple[bool, Optional[str]]:
+        """Initialize the model and processor."""
+        try:
+            # Get device
+            self.device = self.get_device_info()
+            
+            # Load processor
+            self.processor = self.load_processor()
+            if self.processor is None:
+                return False, "Failed to load processor"
+            
+            # Load model
+            self.model = self.load_model(self.device)
+            if self.model is None:
+                return False, "Failed to load model"
+            
+            self.is_loaded = True
+
+            # Warm up so the first user request doesn't pay the
+            # compile/first-run cost
+            self.warmup()
+
+            return True, None
+
+        except Exception as e:
+            return False, f"Error initializing model: {str(e)}"
+
+    def warmup(self):
+        """Run a tiny dummy generation to absorb one-time startup costs.
+
+        Triggers torch.compile compilation (when enabled), cuDNN/kernel
+        selection, and the first cudaMalloc round that populates the
+        caching allocator's pool — all at initialization time instead of
+        during the first user request.
+        """
+        try:
+            dummy = torch.zeros(1, 3, 384, 384, device=self.device,
+                                dtype=self.model.dtype)
+            with torch.inference_mode():
+                self.model.generate(pixel_values=dummy, max_new_tokens=4)
+        except Exception:
+            # Warmup is best-effort; real requests still work without it
+            pass
+    
+    def reload(self) -> Tuple[bool, Optional[str]]:
+        """Drop the cached model/processor entries and load them again."""
+        self._load_processor_cached.clear()
+        self._load_model_cached.clear()
+        self._prepare_model_cached.clear()
+        self.is_loaded = False
+        self._cached_info = None
+        return self.initialize_model()
+
+    def get_input_buffer(self, name: str, tensor: torch.Tensor) -> torch.Tensor:
+        """Copy a host tensor into a pooled device buffer and return it.
+
+        Inference inputs are allocated and freed on every request even
+        though their shapes repeat (pixel_values is always the processor's
+        fixed size). Reusing one device buffer per (name, shape, dtype)
+        keeps allocator traffic near zero in steady state.
+        """
+        key = (name, tuple(tensor.shape), tensor.dtype)
+        buffer = self._buffer_pool.get(key)
+        if buffer is None:
+            # Allocate with inference mode off even if the caller is
+            # inside it: a buffer born as an inference tensor could never
+            # be copy_'d again from outside an inference_mode block
+            # (the coordinator paths stage inputs before entering one)
+            with torch.inference_mode(False):
+                buffer = torch.empty(tensor.shape, dtype=tensor.dtype, device=self.device)
+            self._buffer_pool[key] = buffer
+        buffer.copy_(tensor, non_blocking=True)
+        return buffer
+
+    def get_model_status(self) -> dict:
+        """Get current model status."""
+        return {
+            'is_loaded': self.is_loaded,
+            'device': self.device,
+            'model_id': self.model_id,
+            'has_model': self.model is not None,
+            'has_processor': self.processor is not None
+        }
+    
+    def cleanup_resources(self):
+        """Clean up model resources to free memory."""
+        try:
+            if self.model is not None:
+                del self.model
+                self.model = None
+            
+            if self.processor is not None:
+                del self.processor
+                self.processor = None
+
+            self._buffer_pool.clear()
+            self._cached_info = None
+
+            # Clear cache
+            st.cache_resource.clear()
+            
+            # Force garbage collection
+            gc.collect()
+
+            # Only return blocks to the driver here, on full shutdown;
+            # during serving the caching allocator should keep its pool
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+            
+            self.is_loaded = False
+            st.success("✅ Resources cleaned up successfully!")
+            
+        except Exception as e:
+            st.error(f"❌ Error cleaning up resources: {str(e)}")
+    
+    def get_model_info(self) -> dict:
+        """Get detailed information about the loaded model.
+
+        The dict is memoized on the instance: the sidebar calls this on
+        every rerun and the answers only change on (re)load or cleanup.
+        """
+        if not self.is_loaded:
+            return {"error": "Model not loaded"}
+
+        if self._cached_info is None:
+            info = {
+                'model_id': self.model_id,
+                'device': self.device,
+                'model_type': type(self.model).__name__,
+                'processor_type': type(self.processor).__name__,
+            }
+
+            if torch.cuda.is_available():
+                info.update({
+                    'gpu_name': torch.cuda.get_device_name(0),
+                    'gpu_memory_allocated': f"{torch.cuda.memory_allocated(0) / (1024**3):.2f}GB",
+                    'gpu_memory_cached': f"{torch.cuda.memory_reserved(0) / (1024**3):.2f}GB"
+                })
+
+            self._cached_info = info
+
+        return dict(self._cached_info) 
\ No newline at end of file